@@ -1,9 +1,56 @@
-from fastapi import UploadFile
-from fastapi.responses import JSONResponse
+import asyncio
+from typing import List
+from fastapi import HTTPException, Request, UploadFile
+from fastapi.responses import ORJSONResponse
 from application.services import recognize_service
-async def recognize_text(image: UploadFile):
-    if not image.filename.lower().endswith((".png", ".jpg", ".jpeg")):
-        return JSONResponse(content={"error": "Only image files are supported"}, status_code=400)
-    
-    text = recognize_service.extract_text(image.file)
-    return {"text": text}
+
+_ALLOWED_CONTENT_TYPES = frozenset({"image/png", "image/jpeg"})
+_SIGNATURES = (b"\x89PNG\r\n\x1a\n", b"\xff\xd8\xff")
+_UNREADABLE_IMAGE = "Image could not be decoded"
+
+async def validate_image(image: UploadFile) -> UploadFile:
+    if image.content_type not in _ALLOWED_CONTENT_TYPES:
+        raise HTTPException(status_code=415, detail="Only image files are supported")
+    # sniff the magic number so a mislabelled file is rejected before it is decoded
+    head = await image.read(12)
+    await image.seek(0)
+    if not head.startswith(_SIGNATURES):
+        raise HTTPException(status_code=415, detail="Only image files are supported")
+    return image
+
+async def validate_images(images: List[UploadFile]) -> List[UploadFile]:
+    await asyncio.gather(*(validate_image(image) for image in images))
+    return images
+
+async def recognize_text(request: Request, image: UploadFile, raw: bool = False, output_format: str = "text"):
+    pool = request.app.state.ocr_pool
+    data = await image.read()
+    await image.close()
+    try:
+        if output_format == "tsv":
+            structured = await recognize_service.extract_structured_async(pool, data, raw)
+            return ORJSONResponse({"data": structured})
+
+        text = await recognize_service.extract_text_async(pool, data, raw)
+    except recognize_service.ImageDecodeError:
+        raise HTTPException(status_code=422, detail=_UNREADABLE_IMAGE)
+    return ORJSONResponse({"text": text})
+
+
+async def batch_recognize(request: Request, images: List[UploadFile], raw: bool = False):
+    pool = request.app.state.ocr_pool
+    data = await asyncio.gather(*(image.read() for image in images))
+    await asyncio.gather(*(image.close() for image in images))
+    texts = await asyncio.gather(*(recognize_service.extract_text_async(pool, d, raw) for d in data),
+                                 return_exceptions=True)
+
+    results = []
+    for image, text in zip(images, texts):
+        # one corrupt image shouldn't throw away the rest of the batch
+        if isinstance(text, recognize_service.ImageDecodeError):
+            results.append({"filename": image.filename, "error": _UNREADABLE_IMAGE})
+        elif isinstance(text, BaseException):
+            raise text
+        else:
+            results.append({"filename": image.filename, "text": text})
+    return ORJSONResponse({"results": results})
@@ -1,6 +1,6 @@
-from fastapi import APIRouter, UploadFile
+from typing import Annotated, List, Literal
+from fastapi import APIRouter, Depends, Query, Request, UploadFile
 from application.controllers import recognize_controller
-from fastapi.responses import JSONResponse
 
 router = APIRouter()
 
@@ -10,5 +10,15 @@ async def root():
 
 
 @router.post("/recognize")
-async def recognize_text(image: UploadFile):
-    return await recognize_controller.recognize_text(image)
+async def recognize_text(request: Request,
+                         image: Annotated[UploadFile, Depends(recognize_controller.validate_image)],
+                         raw: bool = False,
+                         output_format: Literal["text", "tsv"] = Query("text", alias="format")):
+    return await recognize_controller.recognize_text(request, image, raw, output_format)
+
+
+@router.post("/recognize/batch")
+async def batch_recognize(request: Request,
+                          images: Annotated[List[UploadFile], Depends(recognize_controller.validate_images)],
+                          raw: bool = False):
+    return await recognize_controller.batch_recognize(request, images, raw)
@@ -1,6 +1,150 @@
+import asyncio
+import hashlib
+import io
+import logging
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
 from PIL import Image
-import pytesseract
+from tesserocr import PyTessBaseAPI, OEM, PSM
 
-def extract_text(image) -> str:
+POOL_SIZE = int(os.environ.get("OCR_POOL_SIZE", os.cpu_count() or 1))
+CACHE_SIZE = 512
+INLINE_HASH_LIMIT = 1 << 20
+MAX_SIDE = int(os.environ.get("OCR_MAX_SIDE", 2000))
+
+_API_OPTIONS = {"lang": "eng", "psm": PSM.SINGLE_BLOCK, "oem": OEM.LSTM_ONLY}
+if os.name == "nt" and "TESSDATA_PREFIX" not in os.environ:
+    # tesseract honours TESSDATA_PREFIX itself, only fall back to the default installer location without it
+    _API_OPTIONS["path"] = r"C:\Program Files\Tesseract-OCR\tessdata"
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=POOL_SIZE)
+_cache = OrderedDict()
+
+def build_pool() -> asyncio.Queue:
+    # one API per executor thread, _executor is sized from the same POOL_SIZE
+    pool = asyncio.Queue()
+    for _ in range(POOL_SIZE):
+        pool.put_nowait(PyTessBaseAPI(**_API_OPTIONS))
+    return pool
+
+def close_pool(pool: asyncio.Queue):
+    while not pool.empty():
+        pool.get_nowait().End()
+
+# tesseract takes bilevel, grey, RGB and RGBA pixels as they are, 0 means one bit per pixel
+_BYTES_PER_PIXEL = {"1": 0, "L": 1, "RGB": 3, "RGBA": 4}
+
+def _set_image(api, img):
+    # SetImage re-encodes the image so leptonica can decode it again, hand over the pixels instead
+    if img.mode not in _BYTES_PER_PIXEL:
+        img = img.convert("L" if img.mode == "LA" else "RGB")
+    bytes_per_pixel = _BYTES_PER_PIXEL[img.mode]
+    bytes_per_line = (img.width + 7) // 8 if bytes_per_pixel == 0 else bytes_per_pixel * img.width
+    api.SetImageBytes(img.tobytes(), img.width, img.height, bytes_per_pixel, bytes_per_line)
+
+def _open(image, raw):
     img = Image.open(image)
-    return pytesseract.pytesseract.image_to_string(img)
+    if img.format == "JPEG":
+        # let libjpeg decode straight to grayscale at a reduced scale, downscale() finishes the resize
+        scale = min(1.0, MAX_SIDE / max(img.size))
+        img.draft("RGB" if raw else "L", (max(1, int(img.width * scale)), max(1, int(img.height * scale))))
+    return img
+
+def downscale(img):
+    scale = min(1.0, MAX_SIDE / max(img.size))
+    if scale < 1:
+        logger.debug("Downscaling %dx%d image by %.3f", img.width, img.height, scale)
+        size = (max(1, int(img.width * scale)), max(1, int(img.height * scale)))
+        img = img.resize(size, Image.Resampling.LANCZOS)
+    return img
+
+def preprocess(pil_img):
+    if pil_img.mode != "L":
+        pil_img = pil_img.convert("L")
+    arr = np.asarray(pil_img)
+    _, binary = cv2.threshold(arr, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    return Image.fromarray(binary)
+
+TSV_COLUMNS = ("level", "page_num", "block_num", "par_num", "line_num", "word_num",
+               "left", "top", "width", "height", "conf", "text")
+
+def _parse_tsv(tsv: str) -> dict:
+    data = {column: [] for column in TSV_COLUMNS}
+    for line in tsv.splitlines():
+        fields = line.split("\t")
+        conf = float(fields[10])
+        # only word rows carry a confidence, page/block/paragraph/line rows are -1
+        if conf < 0:
+            continue
+        for column, value in zip(TSV_COLUMNS[:10], fields):
+            data[column].append(int(value))
+        data["conf"].append(conf)
+        data["text"].append(fields[11])
+    return data
+
+def _recognize_text(api) -> str:
+    return api.GetUTF8Text()
+
+def _recognize_structured(api) -> dict:
+    return _parse_tsv(api.GetTSVText(0))
+
+class ImageDecodeError(ValueError):
+    pass
+
+def _do_ocr(api, image, raw, recognize):
+    try:
+        img = _open(image, raw)
+        # decode now so a corrupt body fails here rather than somewhere inside the pipeline
+        img.load()
+    except OSError as e:
+        raise ImageDecodeError(str(e)) from e
+    if not raw and img.mode != "L":
+        # preprocess() binarizes to one channel anyway, so resize a single channel instead of three
+        img = img.convert("L")
+    img = downscale(img)
+    if not raw:
+        img = preprocess(img)
+    _set_image(api, img)
+    return recognize(api)
+
+def _digest(data: bytes) -> bytes:
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+async def _run(pool: asyncio.Queue, data: bytes, raw: bool, recognize):
+    loop = asyncio.get_running_loop()
+    if len(data) > INLINE_HASH_LIMIT:
+        # hashing a large photo would stall the event loop, the OCR executor may be saturated so use the default one
+        digest = await loop.run_in_executor(None, _digest, data)
+    else:
+        digest = _digest(data)
+    key = (digest, raw, recognize)
+    if key in _cache:
+        _cache.move_to_end(key)
+        return _cache[key]
+
+    api = await pool.get()
+    try:
+        future = loop.run_in_executor(_executor, _do_ocr, api, io.BytesIO(data), raw, recognize)
+    except BaseException:
+        pool.put_nowait(api)
+        raise
+    # return the API once the worker thread is done with it, not when this request goes away,
+    # and shield the future so a cancelled request doesn't mark it done while the thread still runs
+    future.add_done_callback(lambda _: pool.put_nowait(api))
+    result = await asyncio.shield(future)
+
+    _cache[key] = result
+    if len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+    return result
+
+async def extract_text_async(pool: asyncio.Queue, data: bytes, raw: bool = False) -> str:
+    return await _run(pool, data, raw, _recognize_text)
+
+async def extract_structured_async(pool: asyncio.Queue, data: bytes, raw: bool = False) -> dict:
+    return await _run(pool, data, raw, _recognize_structured)
@@ -1,8 +1,23 @@
+import os
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from application import route
+from application.services import recognize_service
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # load the language data before the first request instead of during it
+    app.state.ocr_pool = recognize_service.build_pool()
+    yield
+    recognize_service.close_pool(app.state.ocr_pool)
 
-app = FastAPI()
+
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
 
 origins = [  
     "chrome-extension://kcmfgkjmdhbhlmfkkebomchhnlpedknk",  
@@ -16,4 +31,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=4)
+
 app.include_router(route.router)
\ No newline at end of file
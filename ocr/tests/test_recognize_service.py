@@ -0,0 +1,127 @@
+import asyncio
+import io
+import threading
+import pytest
+from PIL import Image
+from application.services import recognize_service
+
+TSV = (
+    "1\t1\t0\t0\t0\t0\t0\t0\t200\t50\t-1\t\n"
+    "4\t1\t1\t1\t1\t0\t5\t6\t120\t20\t-1\t\n"
+    "5\t1\t1\t1\t1\t1\t5\t6\t50\t20\t96.5\tHello\n"
+    "5\t1\t1\t1\t1\t2\t60\t6\t65\t20\t91\tworld\n"
+)
+
+
+class StubAPI:
+    def SetImageBytes(self, *args):
+        self.args = args
+
+    def GetUTF8Text(self):
+        return "text"
+
+
+class SlowAPI(StubAPI):
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self._lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+
+    def SetImageBytes(self, *args):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        self.started.set()
+        self.release.wait(5)
+        with self._lock:
+            self.active -= 1
+
+
+def _encode(img, fmt):
+    buf = io.BytesIO()
+    img.save(buf, fmt)
+    return buf.getvalue()
+
+
+def test_parse_tsv_keeps_only_word_rows():
+    data = recognize_service._parse_tsv(TSV)
+    assert data["text"] == ["Hello", "world"]
+    assert data["conf"] == [96.5, 91.0]
+    assert data["level"] == [5, 5]
+    assert data["word_num"] == [1, 2]
+    assert data["left"] == [5, 60]
+    assert data["width"] == [50, 65]
+
+
+def test_set_image_packs_bilevel_rows():
+    img = Image.new("1", (10, 3), 1)
+    api = StubAPI()
+    recognize_service._set_image(api, img)
+    imagedata, width, height, bytes_per_pixel, bytes_per_line = api.args
+    assert (width, height, bytes_per_pixel, bytes_per_line) == (10, 3, 0, 2)
+    assert len(imagedata) == bytes_per_line * height
+
+
+def test_set_image_converts_palette_to_rgb():
+    img = Image.new("P", (7, 2))
+    api = StubAPI()
+    recognize_service._set_image(api, img)
+    imagedata, width, height, bytes_per_pixel, bytes_per_line = api.args
+    assert (bytes_per_pixel, bytes_per_line) == (3, 21)
+    assert len(imagedata) == 21 * 2
+
+
+def test_do_ocr_reports_corrupt_image():
+    data = io.BytesIO(b"\x89PNG\r\n\x1a\n" + b"garbage" * 20)
+    with pytest.raises(recognize_service.ImageDecodeError):
+        recognize_service._do_ocr(StubAPI(), data, False, lambda api: "")
+
+
+def test_cancelled_request_keeps_api_until_thread_finishes():
+    async def scenario():
+        api = SlowAPI()
+        pool = asyncio.Queue()
+        pool.put_nowait(api)
+        loop = asyncio.get_running_loop()
+
+        first = asyncio.ensure_future(recognize_service.extract_text_async(pool, _encode(Image.new("L", (20, 20)), "PNG")))
+        assert await loop.run_in_executor(None, api.started.wait, 5)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        assert pool.qsize() == 0
+
+        second = asyncio.ensure_future(recognize_service.extract_text_async(pool, _encode(Image.new("L", (30, 30)), "PNG")))
+        await asyncio.sleep(0.05)
+        assert pool.qsize() == 0
+        assert api.max_active == 1
+
+        api.release.set()
+        assert await second == "text"
+        assert pool.qsize() == 1
+        assert api.max_active == 1
+
+    asyncio.run(scenario())
+
+
+def _ocr_size(data, raw):
+    api = StubAPI()
+    recognize_service._do_ocr(api, io.BytesIO(data), raw, recognize_service._recognize_text)
+    imagedata, width, height, bytes_per_pixel, bytes_per_line = api.args
+    assert len(imagedata) == bytes_per_line * height
+    return width, height
+
+
+@pytest.mark.parametrize("raw", [False, True])
+def test_do_ocr_downscales_elongated_png(raw):
+    data = _encode(Image.new("RGB", (3, 10000), "white"), "PNG")
+    assert _ocr_size(data, raw) == (1, 2000)
+
+
+@pytest.mark.parametrize("raw", [False, True])
+@pytest.mark.parametrize("size, expected", [((3, 10000), (1, 2000)), ((6000, 4000), (2000, 1333))])
+def test_do_ocr_downscales_jpeg(raw, size, expected):
+    data = _encode(Image.new("RGB", size, "white"), "JPEG")
+    assert _ocr_size(data, raw) == expected